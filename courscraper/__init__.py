@@ -4,3 +4,6 @@ __version__ = "0.1.0"
 from .scraper import Scraper
 from .course_json import Course_Json
 from .asset_json import Lecture_Json
+from .proxy_pool import ProxyPool
+from .archive import ResponseArchive
+from .reprocess import reprocess_archive
@@ -1,9 +1,14 @@
 import requests
+import inspect
 import json
+import threading
 import time
+from contextlib import contextmanager
 from functools import wraps
 
+from .archive import Archived_Response, ResponseArchive
 from .misc import progress_bar
+from .proxy_pool import Proxy_Lease, ProxyPool
 
 
 HEADERS = {
@@ -43,16 +48,81 @@ class Apis:
         dump_errors: bool = False,
         dump_dir: str | None = None,
         proxy: dict | None = None,
+        proxy_pool: ProxyPool | None = None,
+        archive: ResponseArchive | None = None,
+        offline: bool = False,
+        timeout: float | tuple[float, float] | None = None,
     ) -> None:
         self.dump_errors = dump_errors
         if dump_errors:
             self.dump_dir = dump_dir or "./"
         self.proxy = proxy or {}
+        self.proxy_pool = proxy_pool
+        # (connect, read) seconds, a hanging proxy must raise to be ejected from the pool
+        if timeout is None and proxy_pool is not None:
+            timeout = (10, 60)
+        self.timeout = timeout
+        if offline and archive is None:
+            raise ValueError("offline mode needs an archive")
+        self.archive = archive
+        self.offline = offline
+        self.__local = threading.local()  # API call sending requests in this thread
+
+    @contextmanager
+    def lease(self):
+        """Borrow a proxy from the pool, or use the single proxy if no pool."""
+        if self.offline:
+            raise RuntimeError("network is disabled in offline mode")
+        if self.proxy_pool is None:
+            yield Proxy_Lease(self.proxy)
+            return
+        with self.proxy_pool.lease() as lease:
+            yield lease
+
+    def request(
+        self, method: str, url: str, **kwargs
+    ) -> requests.Response | Archived_Response:
+        """Send a request through the proxy (pool).
+
+        With an archive, successful JSON responses are saved to it, or loaded from it
+        in offline mode.
+        """
+        archived_request = {
+            "method": method,
+            "url": url,
+            "params": kwargs.get("params"),
+            "json": kwargs.get("json"),
+        }
+        if self.offline:
+            try:
+                response = self.archive.lookup(archived_request)
+            except KeyError:
+                raise ApiError("response not archived", 404, archived_request)
+            return Archived_Response(response["status_code"], response["json"])
+
+        with self.lease() as lease:
+            response = requests.request(
+                method, url, proxies=lease.proxy, timeout=self.timeout, **kwargs
+            )
+            lease.check(response)
+        if self.archive is not None and response.status_code < 400:
+            try:
+                body = response.json()
+            except ValueError:
+                return response
+            self.archive.append(
+                archived_request,
+                {"status_code": response.status_code, "json": body},
+                getattr(self.__local, "call", None),
+            )
+        return response
 
     @staticmethod
     def logger(api_func):
         @wraps(api_func)
         def decorated(self, *args, **kwargs):
+            if self.offline:
+                return api_func(self, *args, **kwargs)
             print(f"\rAPI requesting ({api_func.__name__})... ", end="", flush=True)
             try:
                 result = api_func(self, *args, **kwargs)
@@ -66,11 +136,33 @@ class Apis:
                         encoding="utf8",
                     ) as file:
                         json.dump(error.asdict(), file)
+                raise
             print("Done", flush=True)
             return result
 
         return decorated
 
+    @staticmethod
+    def archived(api_func):
+        """Tag archived responses with the API call, so `reprocess_archive` can replay it."""
+        signature = inspect.signature(api_func)
+
+        @wraps(api_func)
+        def decorated(self, *args, **kwargs):
+            if self.archive is None or self.offline:
+                return api_func(self, *args, **kwargs)
+            bound = signature.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            arguments = dict(list(bound.arguments.items())[1:])  # without self
+            self.__local.call = {"api": api_func.__name__, "arguments": arguments}
+            try:
+                return api_func(self, *args, **kwargs)
+            finally:
+                self.__local.call = None
+
+        return decorated
+
+    @archived
     @logger
     def api_courses(self, slug: str) -> dict:
         """API for basic course information.
@@ -90,7 +182,7 @@ class Apis:
             "slug": slug,
             "fields": "description,primaryLanguages,subtitleLanguages,photoUrl,learningObjectives",
         }
-        response = requests.get(api, params=params, headers=HEADERS, proxies=self.proxy)
+        response = self.request("GET", api, params=params, headers=HEADERS)
         if response.status_code >= 400:
             raise ApiError(
                 f"cannot find the course by slug {slug}",
@@ -99,6 +191,7 @@ class Apis:
             )
         return response.json()["elements"][0]
 
+    @archived
     @logger
     def api_course_materials(self, course_id: str) -> dict:
         """API for course syllabus.
@@ -124,7 +217,7 @@ class Apis:
                 lockedStatus,itemLockSummary)",
             "showLockedItems": "true",
         }
-        response = requests.get(api, params=params, headers=HEADERS, proxies=self.proxy)
+        response = self.request("GET", api, params=params, headers=HEADERS)
         if response.status_code >= 400:
             raise ApiError(
                 f"cannot query syllabus of course({course_id})",
@@ -133,6 +226,7 @@ class Apis:
             )
         return response.json()["linked"]
 
+    @archived
     @logger
     def api_lecture_videos(self, course_id: str, item_id: str) -> list[dict]:
         """API for lecture videos information.
@@ -152,7 +246,7 @@ class Apis:
             "includes": "video",
             "fields": "onDemandVideos.v1(sources,subtitles,subtitlesVtt,subtitlesTxt,subtitlesAssetTags)",
         }
-        response = requests.get(api, params=params, headers=HEADERS, proxies=self.proxy)
+        response = self.request("GET", api, params=params, headers=HEADERS)
         if response.status_code >= 400:
             raise ApiError(
                 f"no item found {course_id}~{item_id}",
@@ -161,6 +255,7 @@ class Apis:
             )
         return response.json()["linked"]["onDemandVideos.v1"]
 
+    @archived
     @logger
     def api_learning_objectives(self, objective_ids: list[str]) -> list[str]:
         """API for learning objective information.
@@ -179,7 +274,7 @@ class Apis:
             "ids": ",".join(objective_ids),
             "fields": "id,description",
         }
-        response = requests.get(api, params=params, headers=HEADERS, proxies=self.proxy)
+        response = self.request("GET", api, params=params, headers=HEADERS)
         if response.status_code >= 400:
             raise ApiError(
                 "no learning objective found",
@@ -191,6 +286,7 @@ class Apis:
             objectives.append(item["description"])
         return objectives
 
+    @archived
     @logger
     def api_search_course(
         self,
@@ -228,8 +324,8 @@ class Apis:
                 }
             ]
         }
-        response = requests.post(
-            api, json=payload, params=params, headers=HEADERS, proxies=self.proxy
+        response = self.request(
+            "POST", api, json=payload, params=params, headers=HEADERS
         )
         for item in response.json()["results"][0]["hits"]:
             if item[validation_field] == validation_content:
@@ -240,13 +336,27 @@ class Apis:
             response.json(),
         )
 
+    @archived
     @logger
-    def api_reviews(self, course_id: str, after: int = 0) -> list[dict]:
+    def api_reviews(
+        self,
+        course_id: str,
+        after: int = 0,
+        ratings: list[int] | None = None,
+        completed: bool | None = None,
+        sort_by_helpful: bool = False,
+        max_count: int | None = None,
+    ) -> list[dict]:
         """API for course reviews. Multiple requests will be sent when needed.
 
         Args:
             course_id (str): course ID in coursera
             after (int, optional): timestamp, reviews published before will be ignored. Defaults to 0
+            ratings (list[int] | None, optional): only fetch reviews with these ratings. Defaults to all (1~5)
+            completed (bool | None, optional): only fetch reviews by learners who completed the course or not.
+                Defaults to None (both)
+            sort_by_helpful (bool, optional): sort by helpful votes instead of publish time. Defaults to False
+            max_count (int | None, optional): stop fetching when enough reviews are fetched. Defaults to None (all)
 
         Raises:
             ApiError: when course ID inexists
@@ -254,8 +364,9 @@ class Apis:
         Returns:
             list[dict]: course reviews
         """
+        page_size = 1000
 
-        def request(start: int, proxy: dict):
+        def request(start: int, limit: int):
             api = "https://www.coursera.org/graphql-gateway-wrapper"
             params = {"opname": "AllCourseReviews"}
             graphql = "query AllCourseReviews($courseId: String!, $limit: Int!, $start: String!, $ratingValues: [Int!],\
@@ -270,18 +381,18 @@ class Apis:
                     "operationName": "AllCourseReviews",
                     "variables": {
                         "courseId": "COURSE~" + course_id,
-                        "limit": 1000,
+                        "limit": limit,
                         "start": str(start),
-                        "ratingValues": [1, 2, 3, 4, 5],
-                        "productCompleted": None,
-                        "sortByHelpfulVotes": False,
+                        "ratingValues": ratings or [1, 2, 3, 4, 5],
+                        "productCompleted": completed,
+                        "sortByHelpfulVotes": sort_by_helpful,
                     },
                     "query": graphql,
                 }
             ]
             print(f"\r\tRequesting ({start}~)...", end="", flush=True)
-            response = requests.post(
-                api, params=params, json=payload, headers=HEADERS, proxies=proxy
+            response = self.request(
+                "POST", api, params=params, json=payload, headers=HEADERS
             )
             if response.status_code >= 400:
                 raise ApiError(
@@ -292,9 +403,17 @@ class Apis:
             return response.json()[0]["data"]["ProductReviewsV1Resource"]["reviews"]
 
         def add_to_result_and_is_over(result: list, fetched_reviews: list) -> bool:
+            if len(fetched_reviews) == 0:
+                return True
+            if sort_by_helpful:
+                # not ordered by time, filter every review
+                result.extend(
+                    [review for review in fetched_reviews if review["reviewedAt"] > after]
+                )
+                return is_full(result)
             if fetched_reviews[-1]["reviewedAt"] > after:
                 result.extend(fetched_reviews)
-                return False  # not over, need fetch more
+                return is_full(result)  # not over unless enough, need fetch more
             # descending list, bisearch
             lower_bound = 0
             upper_bound = len(fetched_reviews)
@@ -307,23 +426,37 @@ class Apis:
             result.extend(fetched_reviews[:lower_bound])
             return True  # over, needn't fetch more
 
+        def is_full(result: list) -> bool:
+            return max_count is not None and len(result) >= max_count
+
+        def next_limit(result: list) -> int:
+            if max_count is None or (sort_by_helpful and after > 0):
+                # `after` drops reviews on the client, keep pages full
+                return page_size
+            # every fetched review counts, only request the ones still missing
+            return max(1, min(page_size, max_count - len(result)))
+
         print("")  # wrap
         start = 0
         reviews = []
+        if max_count is not None and max_count <= 0:
+            return reviews
 
-        raw_data = request(start, self.proxy)
-        start += 1000
+        limit = next_limit(reviews)
+        raw_data = request(start, limit)
+        start += limit
         if add_to_result_and_is_over(reviews, raw_data["elements"]):
-            return reviews
+            return reviews[:max_count]
 
         total = raw_data["paging"]["total"]
         while total > start:
-            raw_data = request(start, self.proxy)
-            start += 1000
+            limit = next_limit(reviews)
+            raw_data = request(start, limit)
+            start += limit
             if add_to_result_and_is_over(reviews, raw_data["elements"]):
                 break
 
-        return reviews
+        return reviews[:max_count]
 
     @logger
     def download_asset(self, url: str, save_path: str):
@@ -341,20 +474,30 @@ class Apis:
                 AppleWebKit/537.36 (KHTML, like Gecko) \
                 Chrome/122.0.0.0 Safari/537.36 Edg/122.0.0.0",
         }
-        response = requests.get(url, headers=headers, proxies=self.proxy, stream=True)
-        if response.status_code >= 400:
-            raise ApiError(
-                "failed to download file",
-                response.status_code,
-                response.json(),
+        # hold the proxy until the transfer is done
+        with self.lease() as lease:
+            response = requests.get(
+                url,
+                headers=headers,
+                proxies=lease.proxy,
+                stream=True,
+                timeout=self.timeout,
             )
+            lease.check(response)
+            if response.status_code >= 400:
+                # CDN errors (e.g. expired signatures) are XML, not JSON
+                raise ApiError(
+                    "failed to download file",
+                    response.status_code,
+                    response.text,
+                )
 
-        chunk_size = 1024 * 512
-        total = int(response.headers.get("content-length") or -1)
-        progress = 0
-        with open(save_path, "wb") as file:
-            for chunk in response.iter_content(chunk_size=chunk_size):
-                if chunk:
-                    file.write(chunk)
-                    progress += chunk_size
-                    progress_bar(progress, total, save_path)
+            chunk_size = 1024 * 512
+            total = int(response.headers.get("content-length") or -1)
+            progress = 0
+            with open(save_path, "wb") as file:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    if chunk:
+                        file.write(chunk)
+                        progress += chunk_size
+                        progress_bar(progress, total, save_path)
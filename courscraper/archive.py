@@ -0,0 +1,198 @@
+import gzip
+import json
+import os
+import re
+import threading
+import time
+import zlib
+
+
+class Archived_Response:
+    def __init__(self, status_code: int, json) -> None:
+        """Stand-in for `requests.Response` when replaying an archive."""
+        self.status_code = status_code
+        self.__json = json
+
+    def json(self):
+        return self.__json
+
+
+class ResponseArchive:
+    def __init__(
+        self,
+        directory: str,
+        max_segment_size: int = 64 * 1024 * 1024,
+        readonly: bool = False,
+    ) -> None:
+        """Open (or create) an archive of raw HTTP responses of coursera APIs.
+
+        Response bodies are appended to gzip segment files, one gzip member per response,
+        and located by an append-only index keyed by the request (method, URL, params,
+        JSON payload). Later responses of the same request win.
+        Segments are the source of truth: responses missing from the index after
+        a crash are recovered from them.
+
+        An archive supports a single writer process, any number of readonly ones.
+
+        Args:
+            directory (str): directory of segment files and the index
+            max_segment_size (int, optional): bytes before starting a new segment. Defaults to 64 MiB.
+            readonly (bool, optional): never modify files, e.g. for offline reprocessing. Defaults to False.
+        """
+        self.directory = directory
+        self.max_segment_size = max_segment_size
+        self.readonly = readonly
+        if not readonly:
+            os.makedirs(directory, exist_ok=True)
+        self.__index_path = os.path.join(directory, "index.jsonl")
+        self.__index = {}
+        self.__segment = 0
+        self.__lock = threading.Lock()
+        self.__load_index()
+
+    @staticmethod
+    def key(request: dict) -> str:
+        return json.dumps(request, sort_keys=True, ensure_ascii=False)
+
+    def __segment_path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"segment-{segment:05d}.jsonl.gz")
+
+    def __load_index(self):
+        ends = {}  # segment -> end of its last indexed response
+        if os.path.exists(self.__index_path):
+            with open(self.__index_path, "rb") as file:
+                data = file.read()
+            complete = data.rfind(b"\n") + 1
+            if complete < len(data) and not self.readonly:
+                # torn write at the end, or the next entry would join this line
+                with open(self.__index_path, "r+b") as file:
+                    file.truncate(complete)
+            for line in data[:complete].splitlines():
+                entry = json.loads(line)
+                self.__index[self.key(entry["request"])] = entry
+                end = entry["offset"] + entry["length"]
+                ends[entry["segment"]] = max(ends.get(entry["segment"], 0), end)
+
+        if not os.path.isdir(self.directory):
+            return
+        for name in sorted(os.listdir(self.directory)):
+            matched = re.fullmatch(r"segment-(\d+)\.jsonl\.gz", name)
+            if matched is None:
+                continue
+            segment = int(matched.group(1))
+            self.__segment = max(self.__segment, segment)
+            self.__recover(segment, ends.get(segment, 0))
+
+    def __recover(self, segment: int, start: int):
+        """Index the responses appended to a segment after `start` but never indexed."""
+        path = self.__segment_path(segment)
+        with open(path, "rb") as file:
+            file.seek(start)
+            data = file.read()
+        offset = start
+        entries = []
+        while len(data) > 0:
+            decompressor = zlib.decompressobj(wbits=31)  # a single gzip member
+            try:
+                record = json.loads(decompressor.decompress(data))
+            except (zlib.error, json.JSONDecodeError):
+                record = None
+            if record is None or not decompressor.eof:
+                # torn write, drop it so later members stay reachable
+                if not self.readonly:
+                    with open(path, "r+b") as file:
+                        file.truncate(offset)
+                break
+            length = len(data) - len(decompressor.unused_data)
+            entries.append(self.__entry(record, segment, offset, length))
+            offset += length
+            data = decompressor.unused_data
+
+        for entry in entries:
+            self.__index[self.key(entry["request"])] = entry
+        if len(entries) > 0:
+            print(f"{len(entries)} responses recovered from {path}")
+            if not self.readonly:
+                with open(self.__index_path, "a", encoding="utf8") as file:
+                    for entry in entries:
+                        file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    @staticmethod
+    def __entry(record: dict, segment: int, offset: int, length: int) -> dict:
+        return {
+            "request": record["request"],
+            "call": record["call"],
+            "segment": segment,
+            "offset": offset,
+            "length": length,
+        }
+
+    def __len__(self) -> int:
+        return len(self.__index)
+
+    def __contains__(self, request: dict) -> bool:
+        return self.key(request) in self.__index
+
+    def calls(self, api: str | None = None) -> list[tuple[str, dict]]:
+        """API calls which sent the archived requests, as (API method name, arguments) pairs.
+
+        Args:
+            api (str | None, optional): only list calls of this API method, e.g. "api_reviews"
+        """
+        calls = {}
+        for entry in self.__index.values():
+            call = entry["call"]
+            if call is None or (api is not None and call["api"] != api):
+                continue
+            calls[self.key(call)] = (call["api"], call["arguments"])
+        return list(calls.values())
+
+    def append(self, request: dict, response, call: dict | None = None) -> None:
+        """Archive a raw response.
+
+        Args:
+            request (dict): method, URL, params and JSON payload of the request
+            response (Any): raw response, e.g. status code and body, serializable by `json.dumps()`
+            call (dict | None, optional): API method ("api") and its "arguments" which sent the request
+        """
+        record = {
+            "request": request,
+            "call": call,
+            "archivedAt": int(time.time()),
+            "response": response,
+        }
+        data = gzip.compress(
+            (json.dumps(record, ensure_ascii=False) + "\n").encode("utf8")
+        )
+        if self.readonly:
+            raise RuntimeError("the archive is readonly")
+        with self.__lock:
+            path = self.__segment_path(self.__segment)
+            if os.path.exists(path) and os.path.getsize(path) >= self.max_segment_size:
+                self.__segment += 1
+                path = self.__segment_path(self.__segment)
+            with open(path, "ab") as file:
+                offset = file.tell()
+                file.write(data)
+            entry = self.__entry(record, self.__segment, offset, len(data))
+            with open(self.__index_path, "a", encoding="utf8") as file:
+                file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self.__index[self.key(request)] = entry
+
+    def lookup(self, request: dict):
+        """Load an archived raw response.
+
+        Args:
+            request (dict): method, URL, params and JSON payload of the request
+
+        Raises:
+            KeyError: when the request is not archived
+
+        Returns:
+            Any: raw response
+        """
+        entry = self.__index[self.key(request)]
+        with open(self.__segment_path(entry["segment"]), "rb") as file:
+            file.seek(entry["offset"])
+            data = file.read(entry["length"])
+        return json.loads(gzip.decompress(data))["response"]
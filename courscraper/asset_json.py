@@ -1,5 +1,6 @@
-from urllib.parse import urlparse
+from urllib.parse import parse_qs, urlparse
 from os.path import splitext
+from time import time
 
 
 class Asset_Json:
@@ -33,10 +34,32 @@ class Lecture_Json(Asset_Json):
         id: str | None = None,
         resolution: str | None = None,
         subtitles: list[Subtitles_Json] = [],
+        course_id: str | None = None,
+        language_codes: list[str] | None = None,
     ) -> None:
         super().__init__(url, id)
         self.resolution = resolution
         self.subtitles = subtitles
+        # stable identifiers used to re-sign `url` right before downloading
+        self.course_id = course_id
+        self.language_codes = language_codes
+
+    def expires_at(self) -> int | None:
+        """Expiry timestamp of the signed video URL, None if unknown."""
+        if self.url is None:
+            return None
+        query = parse_qs(urlparse(self.url).query)
+        for key in ["Expires", "expires"]:
+            if key in query.keys() and query[key][0].isdigit():
+                return int(query[key][0])
+        return None
+
+    def is_expired(self, margin: int = 60) -> bool:
+        """Whether the signed video URL expires within `margin` seconds."""
+        expires_at = self.expires_at()
+        if expires_at is None:
+            return False
+        return expires_at - margin <= time()
 
     def postfix(self) -> str:
         if self.resolution is None:
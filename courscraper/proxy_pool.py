@@ -0,0 +1,180 @@
+import requests
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class Proxy_State:
+    def __init__(self, proxy: dict, max_concurrency: int, window: int) -> None:
+        self.proxy = proxy
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self.results = deque(maxlen=window)  # True for success
+        self.latency = None  # moving average, seconds
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+
+    def error_rate(self) -> float:
+        if len(self.results) == 0:
+            return 0.0
+        return self.results.count(False) / len(self.results)
+
+    def asdict(self) -> dict:
+        return {
+            "proxy": self.proxy,
+            "in_flight": self.in_flight,
+            "error_rate": self.error_rate(),
+            "latency": self.latency,
+            "ejected": self.ejected_until > time.monotonic(),
+        }
+
+
+class Proxy_Lease:
+    def __init__(self, proxy: dict) -> None:
+        self.proxy = proxy
+        self.failed = False
+        self.latency = None  # seconds until response headers arrived
+
+    def check(self, response: requests.Response) -> None:
+        """Record latency, and mark the proxy as failed on gateway errors and rate limiting."""
+        self.latency = response.elapsed.total_seconds()
+        if response.status_code in [407, 429] or response.status_code >= 500:
+            self.failed = True
+
+
+class ProxyPool:
+    def __init__(
+        self,
+        proxies: list[dict],
+        max_concurrency: int | list[int] = 4,
+        strategy: str = "round_robin",
+        window: int = 20,
+        max_error_rate: float = 0.5,
+        max_consecutive_failures: int = 3,
+        ejection_time: float = 60,
+    ) -> None:
+        """Initialize a proxy pool, which balances requests over several proxies.
+
+        Args:
+            proxies (list[dict]): proxies for `requests` library
+            max_concurrency (int | list[int], optional): concurrent requests allowed per proxy,
+                one value for all proxies or one per proxy. Defaults to 4.
+            strategy (str, optional): "round_robin" or "least_loaded". Defaults to "round_robin".
+            window (int, optional): number of recent requests for error rate. Defaults to 20.
+            max_error_rate (float, optional): eject the proxy above this error rate. Defaults to 0.5.
+            max_consecutive_failures (int, optional): eject the proxy after these failures. Defaults to 3.
+            ejection_time (float, optional): seconds before an ejected proxy is tried again. Defaults to 60.
+        """
+        if len(proxies) == 0:
+            raise ValueError("no proxy provided")
+        if strategy not in ["round_robin", "least_loaded"]:
+            raise ValueError(f"unknown strategy ({strategy})")
+        if isinstance(max_concurrency, int):
+            max_concurrency = [max_concurrency] * len(proxies)
+        if len(max_concurrency) != len(proxies):
+            raise ValueError("max_concurrency does not match proxies")
+        if min(max_concurrency) <= 0:
+            raise ValueError("max_concurrency must be positive")
+        self.strategy = strategy
+        self.window = window
+        self.max_error_rate = max_error_rate
+        self.max_consecutive_failures = max_consecutive_failures
+        self.ejection_time = ejection_time
+        self.__states = [
+            Proxy_State(proxy, limit, window)
+            for proxy, limit in zip(proxies, max_concurrency)
+        ]
+        self.__next = 0
+        self.__condition = threading.Condition()
+
+    def stats(self) -> list[dict]:
+        """Health of each proxy."""
+        with self.__condition:
+            return [state.asdict() for state in self.__states]
+
+    @contextmanager
+    def lease(self):
+        """Borrow a proxy until the block exits, recording its health.
+
+        The proxy counts as in flight for the whole block, e.g. a streamed download.
+        Exceptions raised by `requests` count as failures, call `Proxy_Lease.check()`
+        on the response to record its latency and count error responses as well.
+        """
+        state = self.__acquire()
+        lease = Proxy_Lease(state.proxy)
+        try:
+            yield lease
+        except requests.RequestException:
+            lease.failed = True
+            raise
+        finally:
+            self.__release(state, not lease.failed, lease.latency)
+
+    def __available(self, now: float) -> list[Proxy_State]:
+        return [
+            state
+            for state in self.__states
+            if state.ejected_until <= now and state.in_flight < state.max_concurrency
+        ]
+
+    def __select(self, now: float) -> Proxy_State | None:
+        candidates = self.__available(now)
+        if len(candidates) == 0:
+            return None
+        if self.strategy == "least_loaded":
+            return min(
+                candidates,
+                key=lambda state: (
+                    state.in_flight / state.max_concurrency,
+                    state.latency or 0,
+                ),
+            )
+        for _ in range(len(self.__states)):
+            state = self.__states[self.__next]
+            self.__next = (self.__next + 1) % len(self.__states)
+            if state in candidates:
+                return state
+
+    def __acquire(self) -> Proxy_State:
+        with self.__condition:
+            while True:
+                now = time.monotonic()
+                state = self.__select(now)
+                if state is not None:
+                    state.in_flight += 1
+                    return state
+                # wait for a release, or for the earliest ejected proxy to come back
+                ejected = [s.ejected_until for s in self.__states if s.ejected_until > now]
+                timeout = min(ejected) - now if ejected else None
+                self.__condition.wait(timeout)
+
+    def __release(
+        self, state: Proxy_State, success: bool, latency: float | None
+    ) -> None:
+        with self.__condition:
+            state.in_flight -= 1
+            state.results.append(success)
+            if success:
+                state.consecutive_failures = 0
+                if latency is None:
+                    pass
+                elif state.latency is None:
+                    state.latency = latency
+                else:
+                    state.latency = 0.8 * state.latency + 0.2 * latency
+            else:
+                state.consecutive_failures += 1
+                if (
+                    state.consecutive_failures >= self.max_consecutive_failures
+                    or (
+                        len(state.results) == self.window
+                        and state.error_rate() > self.max_error_rate
+                    )
+                ):
+                    print(f"proxy ejected for {self.ejection_time}s ({state.proxy})")
+                    state.ejected_until = time.monotonic() + self.ejection_time
+                    # give it a clean slate when it comes back
+                    state.results.clear()
+                    state.consecutive_failures = 0
+            self.__condition.notify()
@@ -0,0 +1,71 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from .apis import ApiError
+from .archive import ResponseArchive
+from .scraper import Scraper
+
+
+# API call which sent archived requests -> transform to replay it through
+TRANSFORMS = {
+    "api_courses": "get_course_meta",
+    "api_course_materials": "get_course_syllabus",
+    "api_reviews": "get_course_reviews",
+}
+
+_scraper: Scraper | None = None
+
+
+def _init_worker(directory: str):
+    global _scraper
+    archive = ResponseArchive(directory, readonly=True)
+    _scraper = Scraper(archive=archive, offline=True)
+
+
+def _transform(call: tuple[str, dict]) -> dict:
+    api, arguments = call
+    try:
+        if api == "api_courses":
+            course_url = f"https://www.coursera.org/learn/{arguments['slug']}"
+            result = _scraper.get_course_meta(course_url).__dict__
+        elif api == "api_course_materials":
+            result = _scraper.get_course_syllabus(arguments["course_id"])
+        else:
+            result = _scraper.get_course_reviews(**arguments)
+    except ApiError as error:
+        # a dependent response (e.g. course search) was never archived
+        return {"arguments": arguments, "error": error.asdict()}
+    except Exception as error:
+        # keep going, one malformed response should not abort the whole corpus
+        return {"arguments": arguments, "error": {"description": repr(error)}}
+    return {"arguments": arguments, "result": result}
+
+
+def reprocess_archive(
+    directory: str, processes: int | None = None, chunk_size: int = 16
+) -> dict[str, list[dict]]:
+    """Replay archived raw responses through `Apis` and `Scraper` transforms, without network.
+
+    Each archived API call is sent again with the same arguments, and its HTTP requests
+    are answered by the archive.
+
+    Args:
+        directory (str): directory of the `ResponseArchive`
+        processes (int | None, optional): worker processes. Defaults to the number of CPUs.
+        chunk_size (int, optional): calls sent to a worker at once. Defaults to 16.
+
+    Returns:
+        dict[str, list[dict]]: outputs by transform name, such as "get_course_meta",
+            each output has "arguments" and either "result" or "error"
+    """
+    archive = ResponseArchive(directory, readonly=True)
+    calls = [call for call in archive.calls() if call[0] in TRANSFORMS.keys()]
+    outputs = {transform: [] for transform in TRANSFORMS.values()}
+    with ProcessPoolExecutor(
+        max_workers=processes, initializer=_init_worker, initargs=(directory,)
+    ) as executor:
+        for call, output in zip(
+            calls, executor.map(_transform, calls, chunksize=chunk_size)
+        ):
+            outputs[TRANSFORMS[call[0]]].append(output)
+    print(f"{len(calls)} archived calls have been reprocessed.")
+    return outputs
@@ -1,12 +1,15 @@
+from glob import escape, glob
 from html2text import HTML2Text
 from os.path import exists
 from time import sleep
 from urllib.parse import urlparse
 
-from .apis import Apis
+from .apis import Apis, ApiError
+from .archive import ResponseArchive
 from .asset_json import Lecture_Json, Subtitles_Json
 from .course_json import Course_Json
 from .misc import is_supported_site
+from .proxy_pool import ProxyPool
 
 
 class Scraper:
@@ -15,6 +18,10 @@ class Scraper:
         dump_errors: bool = False,
         dump_dir: str | None = None,
         proxy: dict | None = None,
+        proxy_pool: ProxyPool | None = None,
+        archive: ResponseArchive | None = None,
+        offline: bool = False,
+        timeout: float | tuple[float, float] | None = None,
     ) -> None:
         """Initialize a scraper.
 
@@ -22,8 +29,21 @@ class Scraper:
             dump_errors (bool, optional): whether to dump error message when API errors. Defaults to False.
             dump_dir (str | None, optional): directory where error file saves.
             proxy (dict | None, optional): proxy for `requests` libarary.
+            proxy_pool (ProxyPool | None, optional): proxies to balance requests over, `proxy` is ignored if provided.
+            archive (ResponseArchive | None, optional): archive where raw API responses are saved.
+            offline (bool, optional): load raw API responses from `archive` without network. Defaults to False.
+            timeout (float | tuple[float, float] | None, optional): (connect, read) timeout of requests.
+                Defaults to (10, 60) with a proxy pool, no timeout otherwise.
         """
-        self.__apis = Apis(proxy=proxy, dump_errors=dump_errors, dump_dir=dump_dir)
+        self.__apis = Apis(
+            proxy=proxy,
+            proxy_pool=proxy_pool,
+            dump_errors=dump_errors,
+            dump_dir=dump_dir,
+            archive=archive,
+            offline=offline,
+            timeout=timeout,
+        )
 
     def get_course_meta(self, course_url: str) -> Course_Json:
         """Get basic information of a course.
@@ -130,18 +150,37 @@ class Scraper:
             "modules": list(syllabus.values()),
         }
 
-    def get_course_reviews(self, course_id: str, after: int = 0) -> list[dict]:
-        """Get all reviews of the course.
+    def get_course_reviews(
+        self,
+        course_id: str,
+        after: int = 0,
+        ratings: list[int] | None = None,
+        completed: bool | None = None,
+        sort_by_helpful: bool = False,
+        max_count: int | None = None,
+    ) -> list[dict]:
+        """Get reviews of the course, all of them by default.
 
         Args:
             course_id (str): course ID in coursera
             after (int, optional): timestamp, reviews published before will be ignored. Defaults to 0.
+            ratings (list[int] | None, optional): expected ratings, e.g. [1, 2]. Defaults to all.
+            completed (bool | None, optional): whether reviewers completed the course. Defaults to None (both).
+            sort_by_helpful (bool, optional): sort by helpful votes instead of publish time. Defaults to False.
+            max_count (int | None, optional): maximum number of reviews. Defaults to None (all).
 
         Returns:
             list[dict]: reviews list
         """
         reviews = []
-        raw_data = self.__apis.api_reviews(course_id, after)
+        raw_data = self.__apis.api_reviews(
+            course_id,
+            after,
+            ratings=ratings,
+            completed=completed,
+            sort_by_helpful=sort_by_helpful,
+            max_count=max_count,
+        )
 
         for item in raw_data:
             html_parser = HTML2Text()
@@ -186,39 +225,83 @@ class Scraper:
             raise RuntimeError(
                 "course information not provided (id, primary_languages)"
             )
-        lecture = Lecture_Json(id=lecture_id, subtitles=[])
+        # primary languages first, without duplicates
+        language_codes = list(dict.fromkeys(course.primary_languages + language_codes))
+        lecture = Lecture_Json(
+            id=lecture_id,
+            resolution=f"{resolution}p",
+            subtitles=[],
+            course_id=course.id,
+            language_codes=language_codes,
+        )
+        self.__resolve_lecture_video(lecture)
+        return lecture
 
-        raw_data = self.__apis.api_lecture_videos(course.id, lecture_id)
+    def __resolve_lecture_video(self, lecture: Lecture_Json) -> dict:
+        """Fill `lecture.url` with a freshly signed video URL, and `lecture.subtitles`
+        in `lecture.language_codes` if provided.
+
+        Args:
+            lecture (Lecture_Json): lecture with `course_id`, `id` and preferred `resolution`
+
+        Raises:
+            RuntimeError: when multiple videos in one lecture
+            RuntimeError: when no video found in the lecture
+
+        Returns:
+            dict: raw video information
+        """
+        raw_data = self.__apis.api_lecture_videos(lecture.course_id, lecture.id)
         if len(raw_data) > 1:
             raise RuntimeError("multiple videos in one lecture", raw_data)
         raw_data = raw_data[0]
 
+        lecture.url = None
         video_data = raw_data["sources"]["byResolution"]
-        for r in [f"{resolution}p", "360p", "540p", "720p", "240p"]:
+        for r in [lecture.resolution, "360p", "540p", "720p", "240p"]:
             if r in video_data.keys():
                 lecture.resolution = r
                 lecture.url = video_data[r]["mp4VideoUrl"]
                 break
         if lecture.url is None:
             raise RuntimeError(
-                f"no video found in the lecture ({lecture_id})", raw_data
+                f"no video found in the lecture ({lecture.id})", raw_data
             )
 
+        if lecture.language_codes is None:
+            return raw_data
+        lecture.subtitles = []
         subtitles_data = raw_data["subtitlesVtt"]
-        language_codes = set(course.primary_languages + ["zh-CN", "en"])
-        for code in language_codes:
+        for code in lecture.language_codes:
             if code in subtitles_data.keys():
                 lecture.subtitles.append(
                     Subtitles_Json(
                         "https://www.coursera.org" + subtitles_data[code],
-                        lecture_id,
+                        lecture.id,
                         code,
                     )
                 )
         if lecture.subtitles == []:
-            print(f"no subtitles found in lecture ({lecture_id})")
+            print(f"no subtitles found in lecture ({lecture.id})")
             print(raw_data)
+        return raw_data
+
+    def refresh_lecture_url(self, lecture: Lecture_Json) -> Lecture_Json:
+        """Re-sign the video URL of a lecture, whose URL may have expired.
+        Subtitles are rebuilt as well if `language_codes` is provided.
+
+        Args:
+            lecture (Lecture_Json): lecture with `course_id` and `id`
 
+        Raises:
+            RuntimeError: when lecture identifiers are not provided
+
+        Returns:
+            Lecture_Json: the same lecture with a new URL
+        """
+        if lecture.course_id is None or lecture.id is None:
+            raise RuntimeError("lecture information not provided (course_id, id)")
+        self.__resolve_lecture_video(lecture)
         return lecture
 
     def download_lecture(
@@ -227,15 +310,61 @@ class Scraper:
         directory: str = "./",
         sleep_time: int = 0,
         include_subtitles: bool = True,
+        max_retries: int = 1,
     ) -> None:
-        if lecture.url is None:
-            print("no URL provided")
-            return
+        """Download the lecture video and its subtitles.
+
+        The signed video URL is resolved right before transfer when it is missing
+        or about to expire, and refreshed when the CDN rejects it.
+
+        Args:
+            lecture (Lecture_Json): lecture meta, `url` can be None if `course_id` is provided
+            directory (str, optional): save directory. Defaults to "./".
+            sleep_time (int, optional): seconds to sleep after downloading the video. Defaults to 0.
+            include_subtitles (bool, optional): whether to download subtitles. Defaults to True.
+            max_retries (int, optional): refresh attempts on rejected URLs. Defaults to 1.
+        """
+        # re-signing keeps the extension, skip downloaded lectures before any API call
+        if lecture.url is not None:
+            path = f"{directory}/{lecture.filename()}"
+            if exists(path):
+                print(f"{path} exists")
+                return
+        elif lecture.id is not None and lecture.resolution is not None:
+            # plan without URL, the extension is unknown
+            prefix = f"{escape(directory)}/{escape(lecture.id)}"
+            paths = glob(f"{prefix}.{lecture.resolution}.*")
+            if len(paths) > 0:
+                print(f"{paths[0]} exists")
+                return
+        if lecture.url is None or lecture.is_expired():
+            if lecture.course_id is None:
+                print("no URL provided")
+                return
+            self.refresh_lecture_url(lecture)
         path = f"{directory}/{lecture.filename()}"
         if exists(path):
             print(f"{path} exists")
             return
-        self.__apis.download_asset(lecture.url, path)
+        for attempt in range(max_retries + 1):
+            try:
+                self.__apis.download_asset(lecture.url, path)
+                break
+            except ApiError as error:
+                # 403/410: the signature has expired or been revoked
+                if (
+                    error.status_code not in [403, 410]
+                    or lecture.course_id is None
+                    or attempt == max_retries
+                ):
+                    raise
+                print(f"refreshing URL of lecture ({lecture.id})")
+                self.refresh_lecture_url(lecture)
+                # the resolution may fall back to another one, with another extension
+                path = f"{directory}/{lecture.filename()}"
+                if exists(path):
+                    print(f"{path} exists")
+                    return
         sleep(sleep_time)
 
         if not include_subtitles: